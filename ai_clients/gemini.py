@@ -1,6 +1,8 @@
 import google.generativeai as genai
 import config
+import prompt_builder
 import sys  # For error messages
+from typing import List, Optional
 
 
 class GeminiClient:
@@ -105,18 +107,20 @@ class GeminiClient:
 
         return code
 
-    def generate_code(self, prompt: str) -> str | None:
+    def generate_code(self, prompt: str, language: Optional[str] = None) -> str | None:
         """
         Generates code based on the given prompt and language.
 
         Args:
             prompt: The user's request or task description.
+            language: The language to generate; detected from the prompt if None.
 
         Returns:
             The generated code as a string, or None if generation failed.
         """
-        # Step 1: Detect language based on prompt
-        language = self.detect_language(prompt)
+        # Step 1: Detect language based on prompt, unless the caller chose one
+        if language is None:
+            language = self.detect_language(prompt)
 
         full_prompt = f"""
         Generate {language} code for the following task:
@@ -126,6 +130,7 @@ class GeminiClient:
         Ensure the code is complete and runnable.
         For Java, the main class should be named 'Main' and contain the public static void main(String[] args) method.
         For C++, include necessary headers and a main function.
+        For Go, use 'package main' with a main function.
         """
         print(f"{config.EMOJI_GENERATE} Generating {language} code...")
         try:
@@ -151,7 +156,8 @@ class GeminiClient:
             print(f"{config.EMOJI_ERROR} Error during code generation: {e}", file=sys.stderr)
             return None
 
-    def fix_code(self, task: str, language: str, broken_code: str, error_message: str) -> str | None:
+    def fix_code(self, task: str, language: str, broken_code: str, error_message: str,
+                 previous_errors: Optional[List[str]] = None) -> str | None:
         """
         Attempts to fix the provided code based on the error message.
 
@@ -160,31 +166,15 @@ class GeminiClient:
             language: The programming language of the code.
             broken_code: The code that produced an error.
             error_message: The error message captured during execution.
+            previous_errors: Error messages from earlier failed attempts, oldest first.
 
         Returns:
             The potentially fixed code as a string, or None if fixing failed.
         """
-        fix_prompt = f"""
-        The following {language} code was generated for the task "{task}".
-        However, it produced an error when executed.
-
-        Original Task: "{task}"
-
-        Broken Code:
-        ```
-        {broken_code}
-        ```
-
-        Error Message:
-        ```
-        {error_message}
-        ```
-
-        Please fix the {language} code to resolve the error and fulfill the original task.
-        Provide only the corrected, complete, and runnable code, without explanations.
-        For Java, ensure the main class is 'Main'.
-        For C++, ensure necessary headers and a main function are present.
-        """
+        fix_prompt, tokens_saved = prompt_builder.build_fix_prompt(
+            task, language, broken_code, error_message, previous_errors
+        )
+        prompt_builder.report_savings("Fix", fix_prompt, tokens_saved)
         print(f"{config.EMOJI_RETRY} Attempting to fix {language} code...")
         try:
             response = self.model.generate_content(
@@ -207,3 +197,40 @@ class GeminiClient:
         except Exception as e:
             print(f"{config.EMOJI_ERROR} Error during code fixing: {e}", file=sys.stderr)
             return None
+
+    def optimize_code(self, task: str, language: str, code: str, profile_report: str) -> str | None:
+        """
+        Asks for a faster rewrite of working code, guided by its profile.
+
+        Args:
+            task: The original user task.
+            language: The programming language of the code.
+            code: The working but slow code.
+            profile_report: The formatted profile report of the last run.
+
+        Returns:
+            The optimized code as a string, or None if optimization failed.
+        """
+        optimize_prompt, tokens_saved = prompt_builder.build_optimize_prompt(task, language, code, profile_report)
+        prompt_builder.report_savings("Optimize", optimize_prompt, tokens_saved)
+        print(f"{config.EMOJI_RETRY} Requesting optimized {language} code...")
+        try:
+            response = self.model.generate_content(
+                optimize_prompt,
+                generation_config=self.generation_config
+            )
+            if not response.candidates:
+                print(f"{config.EMOJI_ERROR} Code optimization failed. No response candidates.", file=sys.stderr)
+                return None
+
+            extracted_code = self._extract_code(response.text, language)
+
+            if not extracted_code:
+                print(f"{config.EMOJI_ERROR} Code optimization failed. Could not extract code from response.", file=sys.stderr)
+                return None
+
+            return extracted_code
+
+        except Exception as e:
+            print(f"{config.EMOJI_ERROR} Error during code optimization: {e}", file=sys.stderr)
+            return None
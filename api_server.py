@@ -2,6 +2,7 @@ from flask import Flask, request, jsonify
 import config
 from ai_clients.gemini import GeminiClient
 import executor
+import runtimes
 
 app = Flask(__name__)
 
@@ -10,36 +11,135 @@ ai_client = GeminiClient(
     api_key=config.GEMINI_API_KEY,
     model_name=config.GEMINI_MODEL_NAME
 )
+
+# Probe every toolchain once at startup, not on the first request
+runtimes.init_registry()
 # api_server.py (backend update)
 
 # api_server.py (backend update)
 
+def _language_error(language: str) -> tuple | None:
+    """Returns an error response if the language cannot be run here, else None."""
+    if not runtimes.get_runtime(language):
+        return jsonify({"error": f"Language '{language}' is not supported."}), 400
+    if not runtimes.is_available(language):
+        # 503 so a router can retry on a host that has the toolchain
+        return jsonify({"error": f"Language '{language}' is not available on this host."}), 503
+    return None
+
+def _optimize_if_slow(task: str, language: str, code: str, output: str, report: dict) -> dict | None:
+    """
+    Asks the model for a faster rewrite when the profiled run exceeded the
+    threshold, and keeps it only if it still works, prints the same output
+    as the original, and is actually faster.
+    """
+    wall_time = report.get("wall_time_s")
+    if wall_time is None or wall_time <= config.PROFILE_OPTIMIZE_THRESHOLD_S:
+        return None
+
+    optimized_code = ai_client.optimize_code(task, language, code, executor.format_profile_report(report))
+    if not optimized_code:
+        return None
+
+    success, optimized_output, optimized_report = executor.profile_code(optimized_code, language)
+    if not success or optimized_output != output:
+        print(f"{config.EMOJI_INFO} Optimized code failed or changed the output, keeping the original.")
+        return None
+    # A run without a timing cannot be shown to be faster
+    optimized_time = optimized_report.get("wall_time_s") if optimized_report else None
+    if optimized_time is None or optimized_time >= wall_time:
+        print(f"{config.EMOJI_INFO} Optimized code was not faster, keeping the original.")
+        return None
+
+    return {
+        "code": optimized_code,
+        "output": optimized_output,
+        "profile": optimized_report
+    }
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Reports which language runtimes this host can execute."""
+    capabilities = runtimes.capabilities()
+    available = [name for name, details in capabilities.items() if details["available"]]
+    return jsonify({
+        "status": "ok" if available else "unavailable",
+        "available_languages": available,
+        "runtimes": capabilities
+    }), 200 if available else 503
+
 @app.route('/agent', methods=['POST'])
 def handle_task():
     try:
         data = request.get_json()
         task = data.get("task", "").strip()
+        optimize = bool(data.get("optimize", False))
+        # Optimizing needs the profile of the first run
+        profile = optimize or bool(data.get("profile", False))
 
         if not task:
             return jsonify({"error": "'task' is required."}), 400
 
+        # An explicit language is checked before spending a model call on refining
+        language = (data.get("language") or "").strip().lower()
+        if language and (error := _language_error(language)):
+            return error
+
         # Step 1: Refine the prompt
         refined_prompt = ai_client.refine_prompt(task)
 
-        # Step 2: Generate code using the refined prompt (language detection handled internally)
-        code = ai_client.generate_code(refined_prompt)
+        # Step 2: Otherwise pick the language once, from the refined task's keywords
+        # (any registered runtime, so unavailable ones are rejected rather than
+        # silently generated in another language), else the client's heuristics.
+        # The generated code is never scanned.
+        if not language:
+            language = runtimes.detect_language(refined_prompt, available_only=False) \
+                or ai_client.detect_language(refined_prompt)
+            if error := _language_error(language):
+                return error
+
+        # Step 3: Generate code using the refined prompt
+        code = ai_client.generate_code(refined_prompt, language)
         if not code:
             return jsonify({"error": "Code generation failed."}), 500
 
-        # Step 3: Execute code
-        success, output = executor.execute_code(code,language=ai_client.detect_language(code))
+        # Step 4: Execute code
+        report = None
+        if profile:
+            success, output, report = executor.profile_code(code, language)
+        else:
+            success, output = executor.execute_code(code, language)
 
-        return jsonify({
+        # Step 5: On failure, ask the model to fix the code, passing along earlier errors
+        previous_errors = []
+        fix_attempts = 0
+        while not success and fix_attempts < config.MAX_FIX_ATTEMPTS:
+            fix_attempts += 1
+            fixed_code = ai_client.fix_code(refined_prompt, language, code, output, previous_errors)
+            if not fixed_code:
+                break
+            previous_errors.append(output)
+            code = fixed_code
+            if profile:
+                success, output, report = executor.profile_code(code, language)
+            else:
+                success, output = executor.execute_code(code, language)
+
+        result = {
             "refined_prompt": refined_prompt,
             "code": code,
             "success": success,
-            "output": output
-        })
+            "output": output,
+            "fix_attempts": fix_attempts
+        }
+        if profile:
+            result["profile"] = report
+
+        # Step 6 (optional): Ask for a faster rewrite if the run was slow
+        if optimize and success and report:
+            result["optimized"] = _optimize_if_slow(refined_prompt, language, code, output, report)
+
+        return jsonify(result)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -20,6 +20,32 @@ GEMINI_MODEL_NAME = "gemini-1.5-flash" # Or choose another suitable model
 TEMPERATURE = 0.7 # Controls randomness (0.0 = deterministic, 1.0 = max creativity)
 MAX_OUTPUT_TOKENS = 2048 # Max length of the generated code
 
+# --- Prompt Budget ---
+PROMPT_TOKEN_BUDGET = 3000 # Max estimated tokens per prompt sent to the model
+CHARS_PER_TOKEN = 4 # Rough characters-per-token ratio used for estimates
+PROMPT_MAX_TRACE_FRAMES = 5 # Stack frames kept when trimming error output
+PROMPT_MAX_ERROR_LINES = 40 # Lines kept from long error output
+PROMPT_MAX_HISTORY = 3 # Earlier attempts listed in a fix prompt
+PROMPT_MIN_ERROR_TOKENS = 64 # Never shrink the error message below this
+MAX_FIX_ATTEMPTS = 2 # Times the API server asks the model to fix failing code
+
+# --- Profiler Bootstrap ---
+# Runs a Python script under cProfile. Unlike 'python -m cProfile', it lets
+# SystemExit and exceptions through, so the script's exit code is kept.
+# argv: <stats file> <script>
+PYTHON_PROFILER_BOOTSTRAP = (
+    "import cProfile, sys\n"
+    "stats_file = sys.argv[1]\n"
+    "sys.argv = sys.argv[2:]\n"
+    "with open(sys.argv[0], 'rb') as f:\n"
+    "    code = compile(f.read(), sys.argv[0], 'exec')\n"
+    "profiler = cProfile.Profile()\n"
+    "try:\n"
+    "    profiler.runctx(code, {'__name__': '__main__', '__file__': sys.argv[0], '__builtins__': __builtins__}, None)\n"
+    "finally:\n"
+    "    profiler.dump_stats(stats_file)\n"
+)
+
 # --- Supported Languages ---
 # Dictionary mapping language names (lowercase) to their details
 SUPPORTED_LANGUAGES = {
@@ -28,12 +54,18 @@ SUPPORTED_LANGUAGES = {
         "filename": "generated_script.py",
         # Use a list for commands if compilation + execution is needed
         "execute_command": ["python", "{filename}"],
+        # Used by the 'memfd' workspace backend, {filename} becomes /dev/fd/N
+        "memfd_execute_command": ["python", "{filename}"],
+        # Inserted after the interpreter when profiling, {stats_file} is the cProfile output
+        "profiler_args": ["-c", PYTHON_PROFILER_BOOTSTRAP, "{stats_file}"],
         "keywords": ["python", "py"]
     },
     "javascript": {
         "extension": ".js",
         "filename": "generated_script.js",
         "execute_command": ["node", "{filename}"],
+        # Node resolves the real path of the main module, which a memfd does not have
+        "memfd_execute_command": ["node", "--preserve-symlinks", "--preserve-symlinks-main", "{filename}"],
         "keywords": ["javascript", "js", "node.js", "node"]
     },
     "c++": {
@@ -54,14 +86,43 @@ SUPPORTED_LANGUAGES = {
         "class_name": "Main", # The expected main class name
         "compile_command": ["javac", "{filename}"],
         "execute_command": ["java", "{class_name}"],
+        "version_command": ["javac", "-version"],
+        # Warn before compiling if the source does not declare the expected class
+        "source_must_contain": "class Main",
         "keywords": ["java"]
     }
-    # Add more languages here following the same structure
+    # Add more languages here following the same structure,
+    # or as a plugin module (see RUNTIME_PLUGINS below)
 }
 
+# --- Runtime Registry ---
+# Plugin modules that each declare LANGUAGE and RUNTIME (same format as above)
+RUNTIME_PLUGINS = [
+    "runtime_plugins.go",
+    "runtime_plugins.rust",
+    "runtime_plugins.c",
+    "runtime_plugins.typescript",
+]
+RUNTIME_PROBE_TIMEOUT = 10 # Seconds to wait for a toolchain version probe at startup
+
 # --- File Handling ---
 CODE_DIR = "generated_code" # Directory to save generated code
 
+# --- Workspace Backend ---
+# "disk":  sources and build artifacts are written to CODE_DIR
+# "tmpfs": sources and build artifacts are written to a RAM-backed directory under TMPFS_ROOT
+# "memfd": like "tmpfs", but languages with a 'memfd_execute_command' get their
+#          source through an in-memory file descriptor and never touch a filesystem
+# RAM-backed backends fall back to disk when TMPFS_ROOT or memfd is unavailable.
+WORKSPACE_BACKEND = os.getenv("WORKSPACE_BACKEND", "disk")
+TMPFS_ROOT = "/dev/shm" # Mount point of a RAM-backed filesystem
+TMPFS_WORKSPACE_NAME = "ai_agent_workspace" # Prefix of the private per-process directory created under TMPFS_ROOT
+
+# --- Profiling ---
+PROFILE_PYTHON_HOTSPOTS = True # Use a language's 'profiler_args' (cProfile for Python) when profiling
+PROFILE_TOP_N = 10 # Number of hotspots included in a profile report
+PROFILE_OPTIMIZE_THRESHOLD_S = 1.0 # Ask the model for a faster rewrite above this wall time
+
 # --- Emojis for Logging ---
 EMOJI_SUCCESS = "✅"
 EMOJI_ERROR = "💥"
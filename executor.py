@@ -2,24 +2,107 @@
 """
 Handles saving, compiling (if necessary), and executing code for various languages.
 """
+import atexit
 import subprocess
 import os
+import shutil
 import config
+import runtimes
 import sys
+import tempfile
+import time
+import pstats
+import re
 from typing import Tuple, List, Optional
 
-def _get_language_config(language: str) -> Optional[dict]:
-    """Gets the configuration for the specified language."""
-    lang = language.lower()
-    return config.SUPPORTED_LANGUAGES.get(lang)
+# Launcher for profiled runs. It spawns the program from its own small process
+# and reports the program's wall time, CPU time and peak RSS over a pipe.
+# Measuring a direct child of the agent would not work: a forked child's peak
+# RSS includes the memory of the process it was forked from until exec.
+# argv: <report fd> <command...>
+_PROFILE_LAUNCHER = """
+import os, signal, sys, time
+report_fd = int(sys.argv[1])
+os.set_inheritable(report_fd, False)
+floor_kb = 0
+try:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                floor_kb = int(line.split()[1])
+except OSError:
+    pass
+start = time.perf_counter()
+try:
+    pid = os.posix_spawnp(sys.argv[2], sys.argv[2:], os.environ)
+except OSError as e:
+    print(f"Error: Could not start '{sys.argv[2]}': {e}", file=sys.stderr)
+    sys.exit(127)
+_, status, usage = os.wait4(pid, 0)
+wall = time.perf_counter() - start
+os.write(report_fd, f"{wall} {usage.ru_utime + usage.ru_stime} {usage.ru_maxrss} {floor_kb}".encode())
+code = os.waitstatus_to_exitcode(status)
+if code < 0:
+    # Die from the same signal; SIGKILL and SIGSTOP cannot have a handler set
+    try:
+        signal.signal(-code, signal.SIG_DFL)
+    except (OSError, ValueError):
+        pass
+    os.kill(os.getpid(), -code)
+    code = 128 - code
+sys.exit(code)
+"""
+
+# Resolved once by _get_workspace_dir(), the backend does not change at runtime
+_workspace_dir: Optional[str] = None
+
+def _get_workspace_dir() -> str:
+    """
+    Resolves the directory for sources and build artifacts.
+    Uses a RAM-backed directory for the 'tmpfs' and 'memfd' backends,
+    falling back to CODE_DIR on disk when it is unavailable.
+    """
+    global _workspace_dir
+    if _workspace_dir is not None:
+        return _workspace_dir
 
-def _save_code(code: str, filename: str) -> bool:
-    """Saves the code to a file."""
+    backend = config.WORKSPACE_BACKEND.lower()
+    if backend in ("tmpfs", "memfd"):
+        if os.path.isdir(config.TMPFS_ROOT) and os.access(config.TMPFS_ROOT, os.W_OK):
+            try:
+                # A fresh 0700 directory with an unpredictable name, so other
+                # users of the shared tmpfs cannot pre-create or swap it
+                tmpfs_dir = tempfile.mkdtemp(prefix=f"{config.TMPFS_WORKSPACE_NAME}_", dir=config.TMPFS_ROOT)
+                _workspace_dir = tmpfs_dir
+                # The name is unique per process, so nothing else will reuse it
+                atexit.register(shutil.rmtree, tmpfs_dir, ignore_errors=True)
+                print(f"{config.EMOJI_INFO} Using RAM-backed workspace '{tmpfs_dir}'.")
+                return _workspace_dir
+            except OSError as e:
+                print(f"{config.EMOJI_INFO} Warning: Could not create a workspace in '{config.TMPFS_ROOT}': {e}", file=sys.stderr)
+        print(f"{config.EMOJI_INFO} Warning: RAM-backed storage unavailable, falling back to '{config.CODE_DIR}'.", file=sys.stderr)
+    elif backend != "disk":
+        print(f"{config.EMOJI_INFO} Warning: Unknown workspace backend '{config.WORKSPACE_BACKEND}', using disk.", file=sys.stderr)
+
+    # Create it here once: with memfd nothing is saved, but the child still runs in this directory
     try:
-        # Ensure the directory exists
         os.makedirs(config.CODE_DIR, exist_ok=True)
-        filepath = os.path.join(config.CODE_DIR, filename)
-        with open(filepath, "w", encoding="utf-8") as f:
+    except OSError as e:
+        print(f"{config.EMOJI_ERROR} Could not create code directory '{config.CODE_DIR}': {e}", file=sys.stderr)
+    _workspace_dir = config.CODE_DIR
+    return _workspace_dir
+
+def _save_code(code: str, filename: str, directory: str) -> bool:
+    """Saves the code to a file in the given directory."""
+    filepath = os.path.join(directory, filename)
+    try:
+        try:
+            f = open(filepath, "w", encoding="utf-8")
+        except FileNotFoundError:
+            # Only create the directory when it is missing, not on every run
+            os.makedirs(directory, exist_ok=True)
+            f = open(filepath, "w", encoding="utf-8")
+        with f:
             f.write(code)
         print(f"{config.EMOJI_INFO} Code saved to '{filepath}'")
         return True
@@ -27,7 +110,44 @@ def _save_code(code: str, filename: str) -> bool:
         print(f"{config.EMOJI_ERROR} Error saving code to file {filename}: {e}", file=sys.stderr)
         return False
 
-def _run_command(command: List[str], cwd: Optional[str] = None) -> Tuple[bool, str]:
+def _create_memfd(code: str, name: str) -> Optional[int]:
+    """
+    Writes the code to an anonymous in-memory file.
+
+    Returns:
+        The file descriptor, or None if memfd is unavailable on this platform.
+    """
+    if not hasattr(os, "memfd_create"):
+        return None
+    try:
+        fd = os.memfd_create(name)
+    except OSError:
+        return None
+    try:
+        data = code.encode("utf-8")
+        while data:
+            written = os.write(fd, data)
+            data = data[written:]
+        return fd
+    except OSError as e:
+        os.close(fd)
+        print(f"{config.EMOJI_INFO} Warning: Could not write code to memfd: {e}", file=sys.stderr)
+        return None
+
+def _format_result(command: List[str], returncode: int, stdout: str, stderr: str) -> Tuple[bool, str]:
+    """Turns the output of a finished command into a (success, output) pair."""
+    if returncode == 0:
+        return True, stdout.strip()
+    # Combine stdout and stderr for better error context
+    error_output = f"Error executing: {' '.join(command)}\n"
+    if stdout:
+         error_output += f"STDOUT:\n{stdout.strip()}\n"
+    if stderr:
+         error_output += f"STDERR:\n{stderr.strip()}"
+    return False, error_output.strip()
+
+def _run_command(command: List[str], cwd: Optional[str] = None,
+                 pass_fds: Tuple[int, ...] = ()) -> Tuple[bool, str]:
     """Runs a shell command and captures its output."""
     try:
         # print(f"{config.EMOJI_INFO} Running command: {' '.join(command)}") # Debug command
@@ -36,18 +156,10 @@ def _run_command(command: List[str], cwd: Optional[str] = None) -> Tuple[bool, s
             capture_output=True,
             text=True,
             check=False,  # Don't raise exception on non-zero exit code
-            cwd=cwd # Current working directory
+            cwd=cwd, # Current working directory
+            pass_fds=pass_fds # Descriptors the child inherits, e.g. a memfd with the source
         )
-        if process.returncode == 0:
-            return True, process.stdout.strip()
-        else:
-            # Combine stdout and stderr for better error context
-            error_output = f"Error executing: {' '.join(command)}\n"
-            if process.stdout:
-                 error_output += f"STDOUT:\n{process.stdout.strip()}\n"
-            if process.stderr:
-                 error_output += f"STDERR:\n{process.stderr.strip()}"
-            return False, error_output.strip()
+        return _format_result(command, process.returncode, process.stdout, process.stderr)
 
     except FileNotFoundError:
         error_msg = f"Error: Command '{command[0]}' not found. Is it installed and in PATH?"
@@ -58,78 +170,209 @@ def _run_command(command: List[str], cwd: Optional[str] = None) -> Tuple[bool, s
         print(f"{config.EMOJI_ERROR} {error_msg}", file=sys.stderr)
         return False, error_msg
 
-def execute_code(code: str, language: str) -> Tuple[bool, str]:
+def _run_profiled_command(command: List[str], cwd: Optional[str] = None,
+                          pass_fds: Tuple[int, ...] = (),
+                          display_command: Optional[List[str]] = None) -> Tuple[bool, str, dict]:
     """
-    Saves, compiles (if needed), and executes the given code.
-
-    Args:
-        code: The source code string.
-        language: The programming language (e.g., 'python', 'javascript').
+    Runs a command like _run_command, also measuring its resource usage
+    through _PROFILE_LAUNCHER. display_command, if given, is shown in error
+    messages instead of command (e.g. without profiler arguments).
 
     Returns:
-        A tuple containing:
-            - bool: True if execution was successful, False otherwise.
-            - str: The standard output of the script if successful,
-                   or the error message (stderr/stdout) if failed.
+        A tuple of (success, output, report) where report holds 'wall_time_s',
+        'cpu_time_s', 'peak_rss_kb' and 'peak_rss_floor_kb'. The program starts
+        as a copy of the small launcher process, so its peak RSS can never read
+        lower than the launcher's own (the floor); values at the floor are upper
+        bounds. CPU time and memory are None on platforms without posix_spawn
+        and os.wait4.
     """
-    lang_config = _get_language_config(language)
-    if not lang_config:
-        return False, f"Language '{language}' is not supported."
-
-    filename = lang_config["filename"]
-    filepath = os.path.join(config.CODE_DIR, filename)
-    
-    # Special handling for Java: Check if code contains "class Main"
-    if language == "java" and "class Main" not in code:
-         # This check is basic. A mismatch between saved filename and public class name WILL cause javac error.
-         # The GeminiClient tries to mitigate this, but it's not foolproof.
-         print(f"{config.EMOJI_ERROR} Warning: Java code does not contain 'class Main'. Compilation will likely fail.", file=sys.stderr)
-         # Return error early to avoid confusing compilation errors? Or let it fail? Let it fail for now.
-         # return False, "Java source code must contain 'public class Main {...}' to match the filename 'Main.java'."
-
-    if not _save_code(code, filename):
-        return False, f"Failed to save code to {filepath}."
-
-    # --- Compilation Step (if required) ---
-    if "compile_command" in lang_config:
-        compile_cmd_template = lang_config["compile_command"]
-        output_executable = lang_config.get("output_executable") # Optional
-
-        # Replace placeholders in the command template
-        compile_cmd = [
-            part.replace("{filename}", filename).replace("{output_executable}", output_executable or "")
-            for part in compile_cmd_template
-        ]
-        # Remove empty parts resulting from missing optional placeholders
-        compile_cmd = [part for part in compile_cmd if part]
-
-        print(f"{config.EMOJI_INFO} Compiling {language} code...")
-        compile_success, compile_output = _run_command(compile_cmd, cwd=config.CODE_DIR)
-
-        if not compile_success:
-            print(f"{config.EMOJI_ERROR} Compilation failed.", file=sys.stderr)
-            # Clean up source file? Maybe not, user might want to inspect it.
-            # os.remove(filepath) # Optional cleanup
-            return False, f"Compilation Error:\n{compile_output}"
-        print(f"{config.EMOJI_SUCCESS} Compilation successful.")
-        # print(f"Compiler output:\n{compile_output}") # Show compiler output/warnings if needed
-
-    # --- Execution Step ---
-    exec_cmd_template = lang_config["execute_command"]
-    output_executable = lang_config.get("output_executable") # Get again for execution
-    class_name = lang_config.get("class_name") # For Java
-
-    # Replace placeholders
-    exec_cmd = [
-        part.replace("{filename}", filename)
-            .replace("{output_executable}", output_executable or "")
-            .replace("{class_name}", class_name or "")
-        for part in exec_cmd_template
+    report = {"wall_time_s": None, "cpu_time_s": None, "peak_rss_kb": None, "peak_rss_floor_kb": None}
+    if not hasattr(os, "wait4") or not hasattr(os, "posix_spawnp"):
+        start = time.perf_counter()
+        success, output = _run_command(command, cwd=cwd, pass_fds=pass_fds)
+        report["wall_time_s"] = time.perf_counter() - start
+        return success, output, report
+
+    read_fd, write_fd = os.pipe()
+    launcher_cmd = [sys.executable, "-S", "-I", "-c", _PROFILE_LAUNCHER, str(write_fd)] + command
+    try:
+        process = subprocess.run(
+            launcher_cmd,
+            capture_output=True,
+            text=True,
+            check=False,
+            cwd=cwd,
+            pass_fds=pass_fds + (write_fd,)
+        )
+    except Exception as e:
+        os.close(read_fd)
+        error_msg = f"Error running command {' '.join(command)}: {e}"
+        print(f"{config.EMOJI_ERROR} {error_msg}", file=sys.stderr)
+        return False, error_msg, report
+    finally:
+        os.close(write_fd)
+
+    # The launcher has exited, so the few bytes it wrote are already in the pipe
+    try:
+        measurements = os.read(read_fd, 4096).decode().split()
+    finally:
+        os.close(read_fd)
+    if len(measurements) == 4:
+        wall_time, cpu_time, peak_rss, floor = measurements
+        # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+        peak_rss_kb = int(peak_rss) // 1024 if sys.platform == "darwin" else int(peak_rss)
+        report["wall_time_s"] = float(wall_time)
+        report["cpu_time_s"] = float(cpu_time)
+        report["peak_rss_kb"] = peak_rss_kb
+        report["peak_rss_floor_kb"] = int(floor) or None
+
+    success, output = _format_result(display_command or command, process.returncode, process.stdout, process.stderr)
+    return success, output, report
+
+# Traceback frames of config.PYTHON_PROFILER_BOOTSTRAP (run with -c, so "<string>")
+# and of cProfile's runctx, with their source and caret lines
+_PROFILER_FRAME_RE = re.compile(
+    r'^  File "(?:<string>|[^"\n]*cProfile\.py)", line \d+, in \S+\n(?:    .*\n?)*',
+    re.MULTILINE
+)
+
+def _strip_profiler_frames(output: str) -> str:
+    """Removes the profiler bootstrap's frames from Python tracebacks in the output."""
+    return _PROFILER_FRAME_RE.sub("", output)
+
+def _read_hotspots(stats_path: str, source_name: str) -> List[dict]:
+    """Reads the top functions by own time from a cProfile stats file."""
+    try:
+        stats = pstats.Stats(stats_path)
+    except (OSError, TypeError, EOFError) as e:
+        print(f"{config.EMOJI_INFO} Warning: Could not read profile stats: {e}", file=sys.stderr)
+        return []
+
+    hotspots = []
+    # Leave out the profiler's own bookkeeping
+    entries = [item for item in stats.stats.items() if "_lsprof" not in item[0][2]]
+    entries.sort(key=lambda item: item[1][2], reverse=True)
+    for (path, line, function), (_, calls, total_time, cumulative_time, _) in entries[:config.PROFILE_TOP_N]:
+        if path == "~":
+            location = function
+        else:
+            # Code run from a memfd shows up as /dev/fd/N
+            name = source_name if path.startswith("/dev/fd/") else os.path.basename(path)
+            location = f"{name}:{line}({function})"
+        hotspots.append({
+            "function": location,
+            "calls": calls,
+            "total_time_s": total_time,
+            "cumulative_time_s": cumulative_time,
+        })
+    return hotspots
+
+def format_profile_report(report: dict) -> str:
+    """Formats a profile report as readable text."""
+    def _value(key: str, unit: str, fmt: str = "{:.3f}") -> str:
+        return "n/a" if report.get(key) is None else f"{fmt.format(report[key])} {unit}"
+
+    lines = [
+        f"Wall time: {_value('wall_time_s', 's')}",
+        f"CPU time:  {_value('cpu_time_s', 's')}",
+        f"Peak RSS:  {_value('peak_rss_kb', 'KB', '{}')}",
     ]
-    exec_cmd = [part for part in exec_cmd if part] # Clean empty parts
+    floor = report.get("peak_rss_floor_kb")
+    if floor and report.get("peak_rss_kb") is not None and report["peak_rss_kb"] <= floor:
+        lines[-1] += f" (at the {floor} KB launcher floor, actual usage may be lower)"
+    hotspots = report.get("hotspots")
+    if hotspots:
+        lines.append("Hotspots (by own time):")
+        for spot in hotspots:
+            lines.append(
+                f"  {spot['function']}: {spot['calls']} call(s), "
+                f"{spot['total_time_s']:.3f}s own, {spot['cumulative_time_s']:.3f}s cumulative"
+            )
+    return "\n".join(lines)
+
+def _execute(code: str, language: str, profile: bool) -> Tuple[bool, str, Optional[dict]]:
+    """Shared implementation of execute_code and profile_code."""
+    runtime = runtimes.get_runtime(language)
+    if not runtime:
+        return False, f"Language '{language}' is not supported.", None
+    if not runtime.available:
+        # Don't try to run anything, the toolchain was already found missing at startup
+        return False, f"Language '{language}' is not available on this host. Missing: {', '.join(runtime.missing)}.", None
+
+    filename = runtime.filename
+    workspace_dir = _get_workspace_dir()
+    filepath = os.path.join(workspace_dir, filename)
+
+    # Some languages need a specific declaration, e.g. Java's 'class Main' must match 'Main.java'
+    required_snippet = runtime.spec.get("source_must_contain")
+    if required_snippet and required_snippet not in code:
+         # This check is basic. The GeminiClient tries to mitigate this, but it's not foolproof.
+         print(f"{config.EMOJI_ERROR} Warning: {language.capitalize()} code does not contain '{required_snippet}'. Compilation will likely fail.", file=sys.stderr)
 
-    print(f"{config.EMOJI_RUN} Executing {language} code...")
-    exec_success, exec_output = _run_command(exec_cmd, cwd=config.CODE_DIR)
+    # With the memfd backend, interpreters that can read source from a descriptor skip the filesystem
+    source_fd = None
+    if config.WORKSPACE_BACKEND.lower() == "memfd" and runtime.supports_memfd:
+        source_fd = _create_memfd(code, filename)
+
+    if source_fd is not None:
+        exec_cmd = runtime.memfd_command(f"/dev/fd/{source_fd}")
+        pass_fds = (source_fd,)
+    else:
+        if not _save_code(code, filename, workspace_dir):
+            return False, f"Failed to save code to {filepath}.", None
+
+        # --- Compilation Step (if required) ---
+        if runtime.compile_plan:
+            print(f"{config.EMOJI_INFO} Compiling {language} code...")
+            compile_success, compile_output = _run_command(runtime.compile_plan, cwd=workspace_dir)
+
+            if not compile_success:
+                print(f"{config.EMOJI_ERROR} Compilation failed.", file=sys.stderr)
+                # Clean up source file? Maybe not, user might want to inspect it.
+                # os.remove(filepath) # Optional cleanup
+                return False, f"Compilation Error:\n{compile_output}", None
+            print(f"{config.EMOJI_SUCCESS} Compilation successful.")
+            # print(f"Compiler output:\n{compile_output}") # Show compiler output/warnings if needed
+
+        # --- Execution Step ---
+        exec_cmd = runtime.execute_plan
+        pass_fds = ()
+
+    report = None
+    stats_path = None
+    display_cmd = exec_cmd
+    print(f"{config.EMOJI_RUN} Executing {language} code{' from memory' if source_fd is not None else ''}...")
+    try:
+        if profile and "profiler_args" in runtime.spec and config.PROFILE_PYTHON_HOTSPOTS:
+            # A file per run, so concurrent requests never share one.
+            # Absolute, because the child runs with the (possibly relative) workspace as its cwd
+            stats_fd, stats_path = tempfile.mkstemp(suffix=".pstats", dir=os.path.abspath(workspace_dir))
+            os.close(stats_fd)
+            # Run the script under the profiler, the interpreter stays the first argument
+            profiler_args = [part.replace("{stats_file}", stats_path) for part in runtime.spec["profiler_args"]]
+            exec_cmd = exec_cmd[:1] + profiler_args + exec_cmd[1:]
+
+        if profile:
+            exec_success, exec_output, report = _run_profiled_command(
+                exec_cmd, cwd=workspace_dir, pass_fds=pass_fds, display_command=display_cmd
+            )
+        else:
+            exec_success, exec_output = _run_command(exec_cmd, cwd=workspace_dir, pass_fds=pass_fds)
+
+        if stats_path:
+            # The traceback should point at the user's code, not at the profiler
+            exec_output = _strip_profiler_frames(exec_output)
+            # Empty if the program was killed before the stats were written
+            if os.path.getsize(stats_path) > 0:
+                report["hotspots"] = _read_hotspots(stats_path, filename)
+    finally:
+        if source_fd is not None:
+            os.close(source_fd)
+        if stats_path:
+            try:
+                os.remove(stats_path)
+            except OSError:
+                pass
 
     # --- Cleanup (Optional) ---
     # You might want to remove the source file and executable after execution
@@ -137,20 +380,62 @@ def execute_code(code: str, language: str) -> Tuple[bool, str]:
     #     if os.path.exists(filepath):
     #         os.remove(filepath)
     #     if output_executable and language in ["c++"]:
-    #           executable_path = os.path.join(config.CODE_DIR, output_executable)
+    #           executable_path = os.path.join(workspace_dir, output_executable)
     #           if os.path.exists(executable_path):
     #                os.remove(executable_path)
     #     if language == "java":
-    #           class_file = os.path.join(config.CODE_DIR, f"{class_name}.class")
+    #           class_file = os.path.join(workspace_dir, f"{class_name}.class")
     #           if os.path.exists(class_file):
     #                os.remove(class_file)
     # except OSError as e:
     #     print(f"{config.EMOJI_INFO} Warning: Could not clean up generated files: {e}", file=sys.stderr)
 
 
+    if report is not None:
+        print(f"{config.EMOJI_INFO} Profile:\n{format_profile_report(report)}")
+
     if exec_success:
         print(f"{config.EMOJI_SUCCESS} Execution finished.")
-        return True, exec_output
+        return True, exec_output, report
     else:
         print(f"{config.EMOJI_ERROR} Execution failed.", file=sys.stderr)
-        return False, f"Runtime Error:\n{exec_output}"
\ No newline at end of file
+        return False, f"Runtime Error:\n{exec_output}", report
+
+def execute_code(code: str, language: str) -> Tuple[bool, str]:
+    """
+    Saves, compiles (if needed), and executes the given code.
+
+    Args:
+        code: The source code string.
+        language: The programming language (e.g., 'python', 'javascript').
+
+    Returns:
+        A tuple containing:
+            - bool: True if execution was successful, False otherwise.
+            - str: The standard output of the script if successful,
+                   or the error message (stderr/stdout) if failed.
+    """
+    success, output, _ = _execute(code, language, profile=False)
+    return success, output
+
+def profile_code(code: str, language: str) -> Tuple[bool, str, Optional[dict]]:
+    """
+    Like execute_code, but also measures the run.
+
+    Args:
+        code: The source code string.
+        language: The programming language (e.g., 'python', 'javascript').
+
+    Returns:
+        A tuple containing:
+            - bool: True if execution was successful, False otherwise.
+            - str: The standard output of the script if successful,
+                   or the error message (stderr/stdout) if failed.
+            - dict: Wall time, CPU time and peak RSS of the run, plus
+                   cProfile 'hotspots' for Python. Peak RSS includes a small
+                   launcher baseline, see _run_profiled_command.
+                   None if the code never ran (e.g. compilation failed).
+                   Python is run under cProfile, so its timings include
+                   the profiler's overhead.
+    """
+    return _execute(code, language, profile=True)
@@ -9,6 +9,8 @@ import os
 import config
 from ai_clients.gemini import GeminiClient
 import executor # Assuming executor.py is in the same directory orPYTHONPATH
+import prompt_builder
+import runtimes
 
 def detect_or_ask_language(user_prompt: str) -> str | None:
     """
@@ -21,23 +23,11 @@ def detect_or_ask_language(user_prompt: str) -> str | None:
         The detected or chosen language (lowercase), or None if detection fails
         and the user doesn't choose.
     """
-    prompt_lower = user_prompt.lower()
-    detected_language = None
+    # Only offer languages whose toolchain is installed on this host
+    available_runtimes = {runtime.name: runtime for runtime in runtimes.all_runtimes() if runtime.available}
 
     # Try keyword detection
-    for lang, details in config.SUPPORTED_LANGUAGES.items():
-        for keyword in details["keywords"]:
-            # Use word boundaries or specific phrases for better accuracy
-            if f" {keyword} " in prompt_lower or \
-               prompt_lower.startswith(f"{keyword} ") or \
-               prompt_lower.endswith(f" {keyword}") or \
-               prompt_lower == keyword or \
-               f"generate {keyword}" in prompt_lower or \
-               f"write {keyword}" in prompt_lower:
-                detected_language = lang
-                break
-        if detected_language:
-            break
+    detected_language = runtimes.detect_language(user_prompt)
 
     if detected_language:
         print(f"{config.EMOJI_INFO} Detected language: {detected_language.capitalize()}")
@@ -46,7 +36,7 @@ def detect_or_ask_language(user_prompt: str) -> str | None:
         # Ask the user
         print(f"{config.EMOJI_QUESTION} Could not automatically detect the language.")
         print("Please choose a language:")
-        lang_list = list(config.SUPPORTED_LANGUAGES.keys())
+        lang_list = list(available_runtimes.keys())
         for i, lang_name in enumerate(lang_list):
             print(f"  {i + 1}. {lang_name.capitalize()}")
 
@@ -61,7 +51,7 @@ def detect_or_ask_language(user_prompt: str) -> str | None:
                         return chosen_language
                     else:
                         print(f"{config.EMOJI_ERROR} Invalid number. Please try again.")
-                elif choice in config.SUPPORTED_LANGUAGES:
+                elif choice in available_runtimes:
                      chosen_language = choice
                      print(f"{config.EMOJI_INFO} Using language: {chosen_language.capitalize()}")
                      return chosen_language
@@ -183,8 +173,11 @@ def main():
     print("\n--- AI Code Agent Finished ---")
 
 def refine_task_with_reason(refined_prompt, reason):
-    # Add your logic to refine the prompt based on the reason
-    refined_prompt += f"\nIssue: {reason}"
+    # Append the new issue, drop repeats, and only omit older issues if over budget
+    before = prompt_builder.estimate_tokens(refined_prompt) + prompt_builder.estimate_tokens(f"\nIssue: {reason}")
+    refined_prompt = prompt_builder.dedupe_issues(f"{refined_prompt}\nIssue: {reason}")
+    refined_prompt = prompt_builder.trim_issues(refined_prompt, config.PROMPT_TOKEN_BUDGET)
+    prompt_builder.report_savings("Refined", refined_prompt, max(0, before - prompt_builder.estimate_tokens(refined_prompt)))
     return refined_prompt
 
 
@@ -195,5 +188,8 @@ if __name__ == "__main__":
     except OSError as e:
          print(f"{config.EMOJI_ERROR} Could not create code directory '{config.CODE_DIR}': {e}", file=sys.stderr)
          sys.exit(1)
-         
+
+    # Probe every toolchain once up front, not in the middle of a task
+    runtimes.init_registry()
+
     main()
\ No newline at end of file
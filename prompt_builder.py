@@ -0,0 +1,478 @@
+# prompt_builder.py
+"""
+Builds token-budgeted prompts for the AI client.
+Deduplicates repeated issues, trims error logs to their relevant frames,
+summarizes earlier attempts, and reports how many tokens were saved.
+"""
+import os
+import re
+import sys
+import config
+import runtimes
+from typing import List, Optional, Tuple
+
+_ISSUE_PREFIX = "Issue:"
+_PY_TRACEBACK_HEADER = "Traceback (most recent call last):"
+_PY_FRAME_RE = re.compile(r'^\s*File "(?P<path>[^"]+)", line \d+')
+_JAVA_FRAME_RE = re.compile(r'^\s*at \S+\(.*\)$')
+_OMITTED_ISSUES_RE = re.compile(r'^\((\d+) older issue\(s\) omitted\)$')
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimates the number of tokens in a piece of text."""
+    if not text:
+        return 0
+    return max(1, len(text) // config.CHARS_PER_TOKEN)
+
+
+def _normalize(line: str) -> str:
+    """Normalizes a line for duplicate detection."""
+    return " ".join(line.lower().split())
+
+
+def _split_issues(prompt: str) -> Tuple[List[str], List[str], int]:
+    """
+    Splits a prompt into its body lines, its 'Issue: ...' lines and the
+    count from an existing 'older issues omitted' marker.
+    """
+    body_lines = []
+    issues = []
+    omitted = 0
+    for line in prompt.splitlines():
+        marker = _OMITTED_ISSUES_RE.match(line.strip())
+        if marker:
+            omitted += int(marker.group(1))
+        elif line.strip().startswith(_ISSUE_PREFIX):
+            issues.append(line.strip())
+        else:
+            body_lines.append(line)
+
+    # Drop trailing blank lines left behind by removed issues
+    while body_lines and not body_lines[-1].strip():
+        body_lines.pop()
+    return body_lines, issues, omitted
+
+
+def _join_issues(body_lines: List[str], issues: List[str], omitted: int) -> str:
+    """Reassembles a prompt from the parts returned by _split_issues."""
+    lines = list(body_lines)
+    if omitted:
+        lines.append(f"({omitted} older issue(s) omitted)")
+    lines.extend(issues)
+    return "\n".join(lines)
+
+
+def dedupe_issues(prompt: str) -> str:
+    """
+    Removes repeated 'Issue: ...' lines from a prompt. Issues are compared
+    case- and whitespace-insensitively; a repeat moves to the end, since it
+    is the most recent report. Distinct issues are always kept.
+
+    Args:
+        prompt: The prompt text, possibly with repeated issues.
+
+    Returns:
+        The prompt with each issue listed once.
+    """
+    body_lines, issues, omitted = _split_issues(prompt)
+    unique = {}
+    for issue in issues:
+        key = _normalize(issue[len(_ISSUE_PREFIX):])
+        # Re-inserting moves the issue to the end
+        unique.pop(key, None)
+        unique[key] = issue
+    return _join_issues(body_lines, list(unique.values()), omitted)
+
+
+def trim_issues(prompt: str, max_tokens: int) -> str:
+    """
+    Drops the oldest 'Issue: ...' lines until the prompt fits in max_tokens,
+    leaving a marker with how many were omitted. The newest issue is always kept.
+
+    Args:
+        prompt: The prompt text.
+        max_tokens: The size the prompt should fit in.
+
+    Returns:
+        The prompt, unchanged if it already fits.
+    """
+    if estimate_tokens(prompt) <= max_tokens:
+        return prompt
+    body_lines, issues, omitted = _split_issues(prompt)
+    while len(issues) > 1 and estimate_tokens(_join_issues(body_lines, issues, omitted)) > max_tokens:
+        issues.pop(0)
+        omitted += 1
+    return _join_issues(body_lines, issues, omitted)
+
+
+def _collapse_repeats(lines: List[str]) -> List[str]:
+    """Collapses runs of identical consecutive lines into a single line."""
+    collapsed = []
+    previous = None
+    count = 0
+    for line in lines:
+        if line == previous:
+            count += 1
+            continue
+        if count > 1:
+            collapsed.append(f"    [previous line repeated {count - 1} more time(s)]")
+        collapsed.append(line)
+        previous = line
+        count = 1
+    if count > 1:
+        collapsed.append(f"    [previous line repeated {count - 1} more time(s)]")
+    return collapsed
+
+
+def _is_generated_file(path: str) -> bool:
+    """Checks whether a traceback path points at the generated code."""
+    if config.CODE_DIR in path or config.TMPFS_WORKSPACE_NAME in path or path.startswith("/dev/fd/"):
+        return True
+    return os.path.basename(path) in runtimes.source_filenames()
+
+
+def _trim_traceback_section(lines: List[str], max_frames: int) -> List[str]:
+    """
+    Trims the frames of a single traceback, keeping every non-frame line
+    (headers, exception messages) in place.
+    """
+    frames = []  # (start index, end index, is_relevant)
+    i = 0
+    while i < len(lines):
+        match = _PY_FRAME_RE.match(lines[i])
+        if match:
+            start = i
+            i += 1
+            # A frame is followed by its indented source line(s)
+            while i < len(lines) and lines[i].startswith("    ") and not _PY_FRAME_RE.match(lines[i]):
+                i += 1
+            frames.append((start, i, _is_generated_file(match.group("path"))))
+        else:
+            i += 1
+
+    if len(frames) <= max_frames:
+        return lines
+
+    innermost = set(range(len(frames) - max_frames, len(frames)))
+    keep = [idx for idx, frame in enumerate(frames) if frame[2] or idx in innermost]
+    # Cap even relevant frames so deep recursion cannot blow the budget
+    keep = set(keep[-max_frames * 2:])
+
+    result = []
+    frame_starts = {frame[0]: idx for idx, frame in enumerate(frames)}
+    omitted = 0
+    i = 0
+    while i < len(lines):
+        if i in frame_starts:
+            idx = frame_starts[i]
+            start, end, _ = frames[idx]
+            if idx in keep:
+                if omitted:
+                    result.append(f"  ... {omitted} frame(s) omitted ...")
+                    omitted = 0
+                result.extend(lines[start:end])
+            else:
+                omitted += 1
+            i = end
+        else:
+            if omitted:
+                result.append(f"  ... {omitted} frame(s) omitted ...")
+                omitted = 0
+            result.append(lines[i])
+            i += 1
+    if omitted:
+        result.append(f"  ... {omitted} frame(s) omitted ...")
+    return result
+
+
+def _trim_python_traceback(lines: List[str], max_frames: int) -> List[str]:
+    """
+    Keeps frames from the generated code, plus the innermost frames.
+    Chained exceptions are trimmed one traceback at a time, so each root
+    cause and the 'During handling...' separators survive.
+    """
+    sections = [[]]
+    for line in lines:
+        if line.strip() == _PY_TRACEBACK_HEADER and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+
+    result = []
+    for section in sections:
+        result.extend(_trim_traceback_section(section, max_frames))
+    return result
+
+
+def _trim_java_trace(lines: List[str], max_frames: int) -> List[str]:
+    """Keeps only the first frames of each Java stack trace."""
+    result = []
+    frame_count = 0
+    omitted = 0
+    for line in lines:
+        if _JAVA_FRAME_RE.match(line):
+            frame_count += 1
+            if frame_count > max_frames:
+                omitted += 1
+                continue
+        else:
+            if omitted:
+                result.append(f"\t... {omitted} more frame(s) omitted")
+            frame_count = 0
+            omitted = 0
+        result.append(line)
+    if omitted:
+        result.append(f"\t... {omitted} more frame(s) omitted")
+    return result
+
+
+def trim_error_output(error_message: str, max_frames: Optional[int] = None,
+                      max_lines: Optional[int] = None) -> str:
+    """
+    Trims an error log down to the parts that help fix the code.
+
+    Stack traces are reduced to frames from the generated code and the
+    innermost frames, repeated lines are collapsed, and very long logs keep
+    only their head and tail.
+
+    Args:
+        error_message: The raw error output from the executor.
+        max_frames: Maximum number of stack frames to keep (defaults to config).
+        max_lines: Maximum number of lines to keep (defaults to config).
+
+    Returns:
+        The trimmed error message.
+    """
+    if not error_message:
+        return ""
+    if max_frames is None:
+        max_frames = config.PROMPT_MAX_TRACE_FRAMES
+    if max_lines is None:
+        max_lines = config.PROMPT_MAX_ERROR_LINES
+
+    lines = _collapse_repeats(error_message.splitlines())
+    lines = _trim_python_traceback(lines, max_frames)
+    lines = _trim_java_trace(lines, max_frames)
+
+    if len(lines) > max_lines:
+        # The tail carries the actual exception, so it gets the larger share
+        head = max_lines // 3
+        tail = max_lines - head
+        omitted = len(lines) - head - tail
+        lines = lines[:head] + [f"... {omitted} line(s) omitted ..."] + lines[-tail:]
+
+    return "\n".join(lines)
+
+
+def _last_meaningful_line(text: str) -> str:
+    """Returns the last non-empty line of a text, usually the exception."""
+    for line in reversed(text.strip().splitlines()):
+        if line.strip() and not line.strip().startswith("..."):
+            return line.strip()
+    return ""
+
+
+def summarize_attempts(previous_errors: List[str], max_attempts: Optional[int] = None) -> str:
+    """
+    Summarizes earlier failed attempts as one line each.
+
+    Args:
+        previous_errors: Error messages from earlier attempts, oldest first.
+        max_attempts: Maximum number of attempts to list (defaults to config).
+
+    Returns:
+        A short summary, or an empty string if there is no history.
+    """
+    if not previous_errors:
+        return ""
+    if max_attempts is None:
+        max_attempts = config.PROMPT_MAX_HISTORY
+
+    start = max(0, len(previous_errors) - max_attempts)
+    lines = []
+    if start:
+        lines.append(f"- {start} earlier attempt(s) also failed.")
+    seen = set()
+    for number, error in enumerate(previous_errors[start:], start=start + 1):
+        summary = _last_meaningful_line(error)[:200]
+        if _normalize(summary) in seen:
+            lines.append(f"- Attempt {number}: same error as before.")
+            continue
+        seen.add(_normalize(summary))
+        lines.append(f"- Attempt {number}: {summary}")
+    return "\n".join(lines)
+
+
+def _truncate_middle(text: str, max_tokens: int) -> str:
+    """Keeps the head and tail of a text so it fits in max_tokens."""
+    max_chars = max_tokens * config.CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    marker = "\n... [truncated] ...\n"
+    keep = max(0, max_chars - len(marker))
+    head = keep // 2
+    return text[:head] + marker + text[len(text) - (keep - head):]
+
+
+def _render_fix_prompt(task: str, language: str, broken_code: str,
+                       error_message: str, history: str) -> str:
+    """Renders the fix prompt template."""
+    history_section = ""
+    if history:
+        history_section = f"""
+        Earlier attempts (do not repeat these mistakes):
+        {history}
+        """
+    return f"""
+        The following {language} code was generated for the task "{task}".
+        However, it produced an error when executed.
+
+        Original Task: "{task}"
+
+        Broken Code:
+        ```
+        {broken_code}
+        ```
+
+        Error Message:
+        ```
+        {error_message}
+        ```
+        {history_section}
+        Please fix the {language} code to resolve the error and fulfill the original task.
+        Provide only the corrected, complete, and runnable code, without explanations.
+        For Java, ensure the main class is 'Main'.
+        For C++, ensure necessary headers and a main function are present.
+        """
+
+
+def build_fix_prompt(task: str, language: str, broken_code: str, error_message: str,
+                     previous_errors: Optional[List[str]] = None,
+                     token_budget: Optional[int] = None) -> Tuple[str, int]:
+    """
+    Builds a prompt asking the model to fix code, within a token budget.
+
+    Repeated issues are always deduplicated. Beyond that, only when over
+    budget: the attempt history is dropped, the error is truncated in the
+    middle down to PROMPT_MIN_ERROR_TOKENS, and older issues are omitted.
+    The code is never truncated, since the model has to return all of it; if
+    the code alone does not fit, the prompt goes over budget with a warning.
+
+    Args:
+        task: The original user task.
+        language: The programming language of the code.
+        broken_code: The code that produced an error.
+        error_message: The error message captured during execution.
+        previous_errors: Error messages from earlier attempts, oldest first.
+        token_budget: Maximum prompt size in tokens (defaults to config).
+
+    Returns:
+        A tuple containing:
+            - str: The prompt.
+            - int: The estimated number of tokens saved versus the original fix
+                   prompt (full task and error, no history).
+    """
+    if token_budget is None:
+        token_budget = config.PROMPT_TOKEN_BUDGET
+
+    # Baseline: the original fix prompt, with the full task and error and no history
+    original_tokens = estimate_tokens(_render_fix_prompt(task, language, broken_code, error_message, ""))
+
+    task = dedupe_issues(task)
+
+    error = trim_error_output(error_message)
+    history = summarize_attempts(previous_errors or [])
+    prompt = _render_fix_prompt(task, language, broken_code, error, history)
+    if history:
+        # History is new content, so its cost is reported on its own rather than as a saving
+        print(f"{config.EMOJI_INFO} Attempt history adds ~{estimate_tokens(history)} tokens.")
+
+    if estimate_tokens(prompt) > token_budget and history:
+        history = ""
+        prompt = _render_fix_prompt(task, language, broken_code, error, history)
+
+    overflow = estimate_tokens(prompt) - token_budget
+    if overflow > 0:
+        # Shrink the error first, but always leave room for the exception line
+        error_tokens = estimate_tokens(error)
+        error = _truncate_middle(error, max(config.PROMPT_MIN_ERROR_TOKENS, error_tokens - overflow))
+        prompt = _render_fix_prompt(task, language, broken_code, error, history)
+
+    overflow = estimate_tokens(prompt) - token_budget
+    if overflow > 0:
+        # Only now give up older user-reported issues, newest first are kept
+        task = trim_issues(task, max(1, estimate_tokens(task) - overflow))
+        prompt = _render_fix_prompt(task, language, broken_code, error, history)
+
+    _warn_if_over_budget("Fix", prompt, token_budget)
+    return prompt, max(0, original_tokens - estimate_tokens(prompt))
+
+
+def _warn_if_over_budget(label: str, prompt: str, token_budget: int) -> None:
+    """Warns when a prompt could not be trimmed down to its budget."""
+    used = estimate_tokens(prompt)
+    if used > token_budget:
+        print(f"{config.EMOJI_INFO} Warning: {label} prompt is ~{used} tokens, over the budget of {token_budget}. "
+              f"The code is sent in full so the model can return it complete.", file=sys.stderr)
+
+
+def report_savings(label: str, prompt: str, tokens_saved: int) -> None:
+    """Prints the size of a prompt and the tokens saved by trimming it."""
+    used = estimate_tokens(prompt)
+    print(f"{config.EMOJI_INFO} {label} prompt: ~{used} tokens (saved ~{tokens_saved} tokens, "
+          f"budget {config.PROMPT_TOKEN_BUDGET}).")
+
+
+def _render_optimize_prompt(task: str, language: str, code: str, profile_report: str) -> str:
+    """Renders the optimize prompt template."""
+    return f"""
+        The following {language} code was generated for the task "{task}".
+        It runs correctly but too slowly.
+
+        Original Task: "{task}"
+
+        Code:
+        ```
+        {code}
+        ```
+
+        Profile of the last run:
+        ```
+        {profile_report}
+        ```
+
+        Please rewrite the {language} code so it produces the same output faster,
+        focusing on the hotspots above (better algorithms and data structures first).
+        Provide only the optimized, complete, and runnable code, without explanations.
+        For Java, ensure the main class is 'Main'.
+        For C++, ensure necessary headers and a main function are present.
+        """
+
+
+def build_optimize_prompt(task: str, language: str, code: str, profile_report: str,
+                          token_budget: Optional[int] = None) -> Tuple[str, int]:
+    """
+    Builds a prompt asking the model for a faster rewrite.
+    The code is never truncated; an oversized prompt only triggers a warning.
+
+    Args:
+        task: The original user task.
+        language: The programming language of the code.
+        code: The working but slow code.
+        profile_report: The formatted profile report of the last run.
+        token_budget: Maximum prompt size in tokens (defaults to config).
+
+    Returns:
+        A tuple containing:
+            - str: The prompt.
+            - int: The estimated number of tokens saved versus the untrimmed prompt.
+    """
+    if token_budget is None:
+        token_budget = config.PROMPT_TOKEN_BUDGET
+    original_tokens = estimate_tokens(_render_optimize_prompt(task, language, code, profile_report))
+
+    # Only the task is trimmed: the model needs the full code to rewrite it
+    task = dedupe_issues(task)
+    prompt = _render_optimize_prompt(task, language, code, profile_report)
+
+    _warn_if_over_budget("Optimize", prompt, token_budget)
+    return prompt, max(0, original_tokens - estimate_tokens(prompt))
@@ -0,0 +1,7 @@
+# runtime_plugins/__init__.py
+"""
+Optional language runtimes, loaded by runtimes.init_registry().
+Each module declares LANGUAGE (the name) and RUNTIME (details in the
+format of config.SUPPORTED_LANGUAGES). Enable one by listing it in
+config.RUNTIME_PLUGINS.
+"""
@@ -0,0 +1,14 @@
+# runtime_plugins/c.py
+"""C runtime, compiled with gcc."""
+
+LANGUAGE = "c"
+
+RUNTIME = {
+    "extension": ".c",
+    "filename": "generated_script.c",
+    "output_executable": "generated_c_executable",
+    "compile_command": ["gcc", "{filename}", "-o", "{output_executable}", "-std=c11", "-lm"],
+    "execute_command": ["./{output_executable}"],
+    # Plain "c" would match "write code", so only unambiguous keywords
+    "keywords": ["ansi c", "c language", "c99", "c11"]
+}
@@ -0,0 +1,14 @@
+# runtime_plugins/go.py
+"""Go runtime, built with 'go build'."""
+
+LANGUAGE = "go"
+
+RUNTIME = {
+    "extension": ".go",
+    "filename": "generated_script.go",
+    "output_executable": "generated_go_executable",
+    "compile_command": ["go", "build", "-o", "{output_executable}", "{filename}"],
+    "execute_command": ["./{output_executable}"],
+    "version_command": ["go", "version"],
+    "keywords": ["golang", "go language"]
+}
@@ -0,0 +1,13 @@
+# runtime_plugins/rust.py
+"""Rust runtime, compiled directly with rustc (no Cargo project)."""
+
+LANGUAGE = "rust"
+
+RUNTIME = {
+    "extension": ".rs",
+    "filename": "generated_script.rs",
+    "output_executable": "generated_rust_executable",
+    "compile_command": ["rustc", "-O", "{filename}", "-o", "{output_executable}"],
+    "execute_command": ["./{output_executable}"],
+    "keywords": ["rust", "rustlang"]
+}
@@ -0,0 +1,14 @@
+# runtime_plugins/typescript.py
+"""TypeScript runtime, compiled to JavaScript with tsc and run with node."""
+
+LANGUAGE = "typescript"
+
+RUNTIME = {
+    "extension": ".ts",
+    "filename": "generated_script.ts",
+    # Compiled into its own folder, so it cannot overwrite the JavaScript runtime's generated_script.js
+    "output_executable": "ts_build/generated_script.js",
+    "compile_command": ["tsc", "--outDir", "ts_build", "{filename}"],
+    "execute_command": ["node", "{output_executable}"],
+    "keywords": ["typescript", "ts"]
+}
@@ -0,0 +1,251 @@
+# runtimes.py
+"""
+Registry of language runtimes.
+Resolves toolchain paths and versions once, precompiles the compile and
+execute command plans, and reports which languages this host can run.
+Extra runtimes are loaded as plugins listed in config.RUNTIME_PLUGINS.
+"""
+import importlib
+import shutil
+import subprocess
+import sys
+import config
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+FILENAME_PLACEHOLDER = "{filename}"
+
+_registry: Dict[str, "Runtime"] = {}
+_initialized = False
+_source_filenames: Optional[Set[str]] = None
+
+
+def _fill_placeholders(template: List[str], spec: dict) -> List[str]:
+    """Replaces every placeholder except {filename} with its value from the spec."""
+    command = [
+        part.replace("{output_executable}", spec.get("output_executable") or "")
+            .replace("{class_name}", spec.get("class_name") or "")
+        for part in template
+    ]
+    # Remove empty parts resulting from missing optional placeholders
+    return [part for part in command if part]
+
+
+def _is_workspace_relative(tool: str) -> bool:
+    """Checks whether a command runs a file from the workspace, e.g. './a.out'."""
+    return tool.startswith("./") or "{" in tool
+
+
+class Runtime:
+    """A language runtime with its toolchain resolved and command plans precompiled."""
+
+    def __init__(self, name: str, spec: dict):
+        """
+        Builds the runtime and probes its toolchain.
+
+        Args:
+            name: The language name (lowercase), e.g. 'python'.
+            spec: The language details, in the format of config.SUPPORTED_LANGUAGES.
+        """
+        self.name = name
+        self.spec = spec
+        self.filename = spec["filename"]
+        self.keywords = spec.get("keywords", [name])
+        self.tools: Dict[str, Optional[str]] = {}  # Tool name -> resolved path, None if missing
+        self.version: Optional[str] = None
+
+        compile_template = _fill_placeholders(spec["compile_command"], spec) if "compile_command" in spec else None
+        execute_template = _fill_placeholders(spec["execute_command"], spec)
+        memfd_template = _fill_placeholders(spec["memfd_execute_command"], spec) if "memfd_execute_command" in spec else None
+
+        for template in (compile_template, execute_template, memfd_template):
+            if template and not _is_workspace_relative(template[0]) and template[0] not in self.tools:
+                self.tools[template[0]] = shutil.which(template[0])
+
+        # Plans use absolute tool paths so no PATH lookup happens per run
+        self.compile_plan = self._resolve(compile_template, self.filename)
+        self.execute_plan = self._resolve(execute_template, self.filename)
+        self._memfd_template = self._resolve(memfd_template, None)
+        if self._memfd_template:
+            self._memfd_source_indices = [i for i, part in enumerate(self._memfd_template) if FILENAME_PLACEHOLDER in part]
+
+        if self.available:
+            self.version = self._probe_version()
+
+    def _resolve(self, template: Optional[List[str]], filename: Optional[str]) -> Optional[List[str]]:
+        """Swaps in the resolved tool path and, if given, the source filename."""
+        if template is None:
+            return None
+        plan = list(template)
+        if self.tools.get(plan[0]):
+            plan[0] = self.tools[plan[0]]
+        if filename is not None:
+            plan = [part.replace(FILENAME_PLACEHOLDER, filename) for part in plan]
+        return plan
+
+    @property
+    def missing(self) -> List[str]:
+        """Tools that could not be found in PATH."""
+        return [tool for tool, path in self.tools.items() if path is None]
+
+    @property
+    def available(self) -> bool:
+        """True if every tool this runtime needs is installed."""
+        return not self.missing
+
+    @property
+    def supports_memfd(self) -> bool:
+        """True if the interpreter can read its source from a file descriptor."""
+        return self._memfd_template is not None
+
+    def memfd_command(self, source_path: str) -> List[str]:
+        """Returns the execute command reading the source from source_path (e.g. /dev/fd/3)."""
+        command = list(self._memfd_template)
+        for i in self._memfd_source_indices:
+            command[i] = command[i].replace(FILENAME_PLACEHOLDER, source_path)
+        return command
+
+    def _probe_version(self) -> Optional[str]:
+        """Runs the toolchain's version command once and keeps its first line."""
+        version_command = self.spec.get("version_command")
+        if version_command is None:
+            first_tool = next(iter(self.tools), None)
+            if first_tool is None:
+                return None
+            version_command = [first_tool, "--version"]
+        version_command = list(version_command)
+        if self.tools.get(version_command[0]):
+            version_command[0] = self.tools[version_command[0]]
+
+        try:
+            process = subprocess.run(
+                version_command,
+                capture_output=True,
+                text=True,
+                check=False,
+                timeout=config.RUNTIME_PROBE_TIMEOUT
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"{config.EMOJI_INFO} Warning: Could not get {self.name} version: {e}", file=sys.stderr)
+            return None
+        # Some tools (e.g. java -version) print their version to stderr
+        for line in (process.stdout + "\n" + process.stderr).splitlines():
+            if line.strip():
+                return line.strip()
+        return None
+
+    def capabilities(self) -> dict:
+        """Describes this runtime for the health endpoint."""
+        return {
+            "available": self.available,
+            "version": self.version,
+            "compiled": self.compile_plan is not None,
+            "memfd": self.supports_memfd,
+            "toolchain": dict(self.tools),
+            "missing": self.missing,
+        }
+
+
+def register_runtime(name: str, spec: dict) -> Runtime:
+    """
+    Registers (or replaces) a runtime.
+
+    Args:
+        name: The language name, e.g. 'go'.
+        spec: The language details, in the format of config.SUPPORTED_LANGUAGES.
+
+    Returns:
+        The registered runtime.
+    """
+    runtime = Runtime(name.lower(), spec)
+    _registry[runtime.name] = runtime
+    if runtime.available:
+        print(f"{config.EMOJI_INFO} Runtime '{runtime.name}' available ({runtime.version or 'unknown version'}).")
+    else:
+        print(f"{config.EMOJI_INFO} Runtime '{runtime.name}' unavailable, missing: {', '.join(runtime.missing)}.")
+    return runtime
+
+
+def _iter_specs() -> Iterator[Tuple[str, dict]]:
+    """
+    Yields (name, spec) for the built-in languages and every plugin.
+    Only imports plugin modules, it does not probe any toolchain.
+    """
+    for name, spec in config.SUPPORTED_LANGUAGES.items():
+        yield name, spec
+    for module_name in config.RUNTIME_PLUGINS:
+        try:
+            module = importlib.import_module(module_name)
+            yield module.LANGUAGE, module.RUNTIME
+        except (ImportError, AttributeError) as e:
+            print(f"{config.EMOJI_ERROR} Could not load runtime plugin '{module_name}': {e}", file=sys.stderr)
+
+
+def init_registry() -> None:
+    """Registers the built-in runtimes and plugins. Only runs once."""
+    global _initialized
+    if _initialized:
+        return
+    _initialized = True
+    for name, spec in _iter_specs():
+        try:
+            register_runtime(name, spec)
+        except KeyError as e:
+            print(f"{config.EMOJI_ERROR} Runtime '{name}' is missing required setting {e}.", file=sys.stderr)
+
+
+def source_filenames() -> Set[str]:
+    """Source filenames of every known language, without probing toolchains."""
+    global _source_filenames
+    if _source_filenames is None:
+        _source_filenames = {spec["filename"] for _, spec in _iter_specs() if "filename" in spec}
+    return _source_filenames
+
+
+def get_runtime(language: str) -> Optional[Runtime]:
+    """Gets the runtime for a language, or None if it is not registered."""
+    init_registry()
+    return _registry.get(language.lower())
+
+
+def all_runtimes() -> List[Runtime]:
+    """Returns every registered runtime, available or not."""
+    init_registry()
+    return list(_registry.values())
+
+
+def is_available(language: str) -> bool:
+    """True if the language is registered and its toolchain is installed."""
+    runtime = get_runtime(language)
+    return runtime is not None and runtime.available
+
+
+def detect_language(text: str, available_only: bool = True) -> Optional[str]:
+    """
+    Detects a language from keywords in a task description.
+
+    Args:
+        text: The task description.
+        available_only: Only consider languages whose toolchain is installed.
+
+    Returns:
+        The language name, or None if no keyword matched.
+    """
+    text = text.lower()
+    for runtime in all_runtimes():
+        if available_only and not runtime.available:
+            continue
+        for keyword in runtime.keywords:
+            # Use word boundaries or specific phrases for better accuracy
+            if f" {keyword} " in text or \
+               text.startswith(f"{keyword} ") or \
+               text.endswith(f" {keyword}") or \
+               text == keyword or \
+               f"generate {keyword}" in text or \
+               f"write {keyword}" in text:
+                return runtime.name
+    return None
+
+
+def capabilities() -> Dict[str, dict]:
+    """Describes every registered runtime, keyed by language name."""
+    return {runtime.name: runtime.capabilities() for runtime in all_runtimes()}